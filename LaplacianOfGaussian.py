@@ -1,38 +1,88 @@
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.ndimage import convolve, gaussian_filter
+import scipy.fft
 import cv2
 
+# Kernels at least this wide are applied in the frequency domain; below it
+# the separable spatial filter is faster
+FFT_MIN_SIZE = 61
+
 def LoG_filter(image, sigma, size=None, pre_blur=False):
-    # Optionally apply Gaussian blur to the image to reduce noise
+    # Optionally blur the image to reduce noise. Gaussians compose, so the
+    # blur is folded into the LoG sigma instead of being a separate pass.
     if pre_blur:
-        image = gaussian_filter(image, sigma=sigma/2)
+        sigma = np.sqrt(sigma**2 + (sigma / 2)**2)
 
-    # Generate LoG kernel
     if size is None:
         size = int(6 * sigma + 1) if sigma >= 1 else 7
 
     if size % 2 == 0:
         size += 1
 
-    x, y = np.meshgrid(np.arange(-size//2+1, size//2+1), np.arange(-size//2+1, size//2+1))
-    kernel = -(1/(np.pi * sigma**4)) * (1 - ((x**2 + y**2) / (2 * sigma**2))) * np.exp(-(x**2 + y**2) / (2 * sigma**2))
-
-    # Normalize the kernel to ensure that the sum of absolute values is 1
-    kernel /= np.sum(np.abs(kernel))
+    # Single precision throughout: the filter passes are memory-bound, and
+    # float32 halves the bytes moved compared with float64
+    image = np.asarray(image, dtype=np.float32)
+    if size >= FFT_MIN_SIZE:
+        return _fft_filter(image, sigma, size)
 
-    # Perform convolution with the LoG kernel
-    result = convolve(image, kernel)
+    # The LoG kernel is Gxx(x)G(y) + G(x)Gyy(y), so it can be applied as two
+    # separable filters instead of one 2-D convolution
+    g, d = _log_kernels(sigma, size)
+    result = cv2.sepFilter2D(image, cv2.CV_32F, d, g, borderType=cv2.BORDER_REFLECT)
+    result += cv2.sepFilter2D(image, cv2.CV_32F, g, d, borderType=cv2.BORDER_REFLECT)
 
     return result
 
+def _fft_filter(image, sigma, size):
+    # Reflect-pad to match the spatial path's border handling. Circular
+    # wrap-around then only reaches the padding, which is cropped off.
+    radius = size // 2
+    padded = np.pad(image, radius, mode='symmetric')
+    shape = tuple(scipy.fft.next_fast_len(n, real=True) for n in padded.shape)
+    spectrum = scipy.fft.rfft2(padded, shape) * _kernel_fft(shape, sigma, size)
+    result = scipy.fft.irfft2(spectrum, shape)
+    (h, w) = image.shape
+    return result[2*radius:2*radius+h, 2*radius:2*radius+w]
+
+@functools.lru_cache(maxsize=8)
+def _kernel_fft(shape, sigma, size):
+    # Cached so repeated calls on same-shape images skip the kernel FFT
+    g, d = _log_kernels(sigma, size)
+    kernel = _log_kernel2d(g, d)
+    return scipy.fft.rfft2(kernel, shape)
+
+@functools.lru_cache(maxsize=32)
+def _log_kernels(sigma, size):
+    # 1-D Gaussian and second derivative kernels making up the LoG kernel,
+    # cached per (sigma, size) so a batch of images builds them only once
+    x = np.arange(-size//2+1, size//2+1)
+    g = np.exp(-x**2 / (2 * sigma**2))
+    d = (x**2 / sigma**2 - 1) * g
+
+    # Normalize so the sum of absolute values of the 2-D kernel is 1
+    scale = np.sqrt(np.sum(np.abs(_log_kernel2d(g, d))))
+    kernels = tuple(np.ascontiguousarray(k / scale, dtype=np.float32) for k in (g, d))
+
+    # The cache hands out the same arrays on every call
+    for k in kernels:
+        k.flags.writeable = False
+    return kernels
+
+def _log_kernel2d(g, d):
+    # Gyy(y)G(x) + G(y)Gxx(x), broadcast from column and row views of the
+    # 1-D kernels and summed in place
+    kernel = d[:, np.newaxis] * g
+    kernel += g[:, np.newaxis] * d
+    return kernel
+
 # Example usage:
 image = cv2.imread(r"eifel.png", cv2.IMREAD_GRAYSCALE)  # Replace with your image path
 sigma = 3
 filtered_image = LoG_filter(image, sigma)
 
-# Save the filtered image in full resolution
-cv2.imwrite('LoG_Filtered_Image.png', filtered_image)
+# Save the filtered image in full resolution, stretched to the 8-bit range PNG stores
+cv2.imwrite('LoG_Filtered_Image.png', cv2.normalize(filtered_image, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U))
 
 # Optionally, you can still plot the original and filtered images for visual inspection
 plt.figure(figsize=(10, 5))
@@ -3,6 +3,7 @@
 import re
 import os
 from splines import *
+import numpy as np
 from bisect import bisect_left
 import random
 import math
@@ -63,16 +64,15 @@ class Curve(object):
         self.process()
 
     def build_spline(self, knots):
-        ncs = NaturalCubicSpline(tuples2points(knots))
-        points = []
+        ncs = NaturalCubicSpline.from_points(knots)
+        samples = []
         u = 0.0
         du = 0.1
         lim = len(ncs) + du
         while (u < lim):
-            p = ncs(u)
-            points.append(tuple(p))
+            samples.append(u)
             u = u + du
-        return points
+        return ncs(np.array(samples))
 
     def process(self):
         knots = []
@@ -152,16 +152,15 @@ class NameCurve(object):
         return self.hum_curve[step]
 
     def build_spline(self, knots):
-        ncs = NaturalCubicSpline(tuples2points(knots))
-        points = []
+        ncs = NaturalCubicSpline.from_points(knots)
+        samples = []
         u = 0.0
         du = 0.1
         lim = len(ncs) + du
         while (u < lim):
-            p = ncs(u)
-            points.append(tuple(p))
+            samples.append(u)
             u = u + du
-        return points
+        return ncs(np.array(samples))
 
     def process(self):
         kv = [(0, 0)]
@@ -1,13 +1,23 @@
 import random
 import math
+import functools
 import matplotlib.pyplot as plt
 import numpy as np
 from curves import CurveSet  # Ensure you have this module or correct the import
 from graphics import *
 
+# numba
+NUMBA_ENABLED = True
+try:
+    from numba import njit, prange, set_num_threads
+    from numba import config as numba_config
+except ImportError:
+    NUMBA_ENABLED = False
+
 class CrystalEnvironment(dict):
     def __init__(self, curves=None, **kw):
         self.curves = curves
+        self._init_curve_table()
         self._init_defaults()
         self.update(**kw)
         self.set_factory_settings()
@@ -18,9 +28,20 @@ class CrystalEnvironment(dict):
     def step(self, x):
         if self.curves is None:
             return
+        if x < self._curve_table.shape[1]:
+            self.update(zip(self._curve_keys, self._curve_table[:, x].tolist()))
+            return
         for key in self.curves:
             self[key] = self.curves[key][x]
 
+    def _init_curve_table(self):
+        # Sample every curve over the run once, so step() reads one column
+        # instead of interpolating each curve again
+        self._curve_keys = list(self.curves) if self.curves is not None else []
+        steps = getattr(self.curves, "steps", 0)
+        table = [[self.curves[key][x] for x in range(steps)] for key in self._curve_keys]
+        self._curve_table = np.array(table, dtype=float).reshape(len(self._curve_keys), steps)
+
     @classmethod
     def build_env(cls, name, steps, min_gamma=0.45, max_gamma=0.85):
         curves = {
@@ -49,31 +70,77 @@ class CrystalEnvironment(dict):
         self["gamma"] = 0.5
 
 
+# (dx, dy) offsets of the six neighbours of a cell on the hex lattice
+HEX_OFFSETS = ((0, 1), (0, -1), (-1, 0), (1, 0), (-1, -1), (1, 1))
+
+@functools.lru_cache(maxsize=360)
+def _unit_vector(angle):
+    # (cos, sin) of an angle given in degrees
+    angle = math.radians(angle)
+    return math.cos(angle), math.sin(angle)
+
 class CrystalLattice:
-    def __init__(self, size, environment=None, celltype=None, max_steps=0, margin=None):
+    def __init__(self, size, environment=None, celltype=None, max_steps=0, margin=None, threads=None):
         self.size = size
         self.environment = environment if environment else CrystalEnvironment()
         self.celltype = celltype if celltype else SnowflakeCell
         self.iteration = 1
         self.margin = margin if margin else 0.85
         self.max_steps = max_steps
-        self._init_cells()
-
-    def _init_cells(self):
-        self.cells = [None] * (self.size * self.size)
-        for x in range(self.size):
-            for y in range(self.size):
-                xy = (x, y)
-                cell = self.celltype(xy, self)
-                idx = self._cell_index(xy)
-                self.cells[idx] = cell
-        center_pt = self._cell_index((self.size // 2, self.size // 2))
-        self.cells[center_pt].attach(1)
+        self.threads = threads  # numba worker threads; None keeps numba's default
+        self._rng = np.random.default_rng()
+        self._init_arrays()
+
+    def _init_arrays(self):
+        # Cell state is kept as one array per field, indexed [y, x]
+        shape = (self.size, self.size)
+        self.dm = np.full(shape, self.environment["gamma"], dtype=np.float32)
+        self.bm = np.zeros(shape, dtype=np.float32)
+        self.cm = np.zeros(shape, dtype=np.float32)
+        self.age = np.zeros(shape, dtype=np.int32)
+        self.attached = np.zeros(shape, dtype=bool)
+        self.boundary = np.zeros(shape, dtype=bool)
+        self._next_dm = np.empty_like(self.dm)
+        self._noise = np.empty_like(self.dm)
+        self.n_attached = np.zeros(shape, dtype=np.uint8)
+        self._init_neighbors()
+        self.n_neighbors = (self.neighbors_idx >= 0).sum(axis=1).astype(np.uint8).reshape(shape)
+        self._cells = None
+        self._rays = {}
+        center = self.size // 2
+        self.attach((center, center), 1)
+
+    @property
+    def cells(self):
+        # Per-cell views over the arrays, only built when something asks
+        if self._cells is None:
+            self._cells = [self.celltype((x, y), self) for y in range(self.size) for x in range(self.size)]
+        return self._cells
+
+    def _init_neighbors(self):
+        # Flat index of each neighbour of each cell, in HEX_OFFSETS order,
+        # with -1 where the neighbour would fall off the lattice
+        (ys, xs) = np.divmod(np.arange(self.size * self.size), self.size)
+        nidx = np.full((self.size * self.size, len(HEX_OFFSETS)), -1, dtype=np.int32)
+        for (col, (dx, dy)) in enumerate(HEX_OFFSETS):
+            nx = xs + dx
+            ny = ys + dy
+            ok = (nx >= 0) & (nx < self.size) & (ny >= 0) & (ny < self.size)
+            nidx[ok, col] = (ny * self.size + nx)[ok]
+        self.neighbors_idx = nidx
 
     def _cell_index(self, xy):
         (x, y) = xy
         return y * self.size + x  # Simplified and fixed index calculation
 
+    def _neighbor_sum(self, a):
+        # Sum of a over each cell's neighbours; cells past the edge count as 0
+        padded = np.pad(a, 1)
+        total = np.zeros_like(a)
+        for (dx, dy) in HEX_OFFSETS:
+            total += padded[1 + dy:1 + dy + self.size, 1 + dx:1 + dx + self.size]
+        return total
+
     def crop_snowflake(self, margin=None):
         def scale(val):
             X_SCALE_FACTOR = (1.0 / math.sqrt(3))
@@ -89,15 +156,8 @@ class CrystalLattice:
         return box
 
     def get_neighbors(self, xy):
-        (x, y) = xy
-        nlist = [(x, y + 1), (x, y - 1), (x - 1, y), (x + 1, y), (x - 1, y - 1), (x + 1, y + 1)]
-        nlist = map(self._cell_index, filter(self._xy_ok, nlist))
-        res = tuple([self.cells[nidx] for nidx in nlist if self.cells[nidx] != None])
-        return res
-    
-    def _xy_ok(self, xy):
-        (x, y) = xy
-        return (x >= 0 and x < self.size and y >= 0 and y < self.size)
+        nidx = self.neighbors_idx[self._cell_index(xy)]
+        return tuple([self.cells[i] for i in nidx[nidx >= 0]])
 
     def grow(self):
         while True:
@@ -105,22 +165,87 @@ class CrystalLattice:
             if not self.headroom():
                 break
 
+    def attach(self, xy, offset=0.0):
+        (x, y) = xy
+        self.cm[y, x] += self.bm[y, x] + offset
+        self.bm[y, x] = 0
+        self._mark_attached(np.array([self._cell_index(xy)]))
+
+    def _mark_attached(self, idx):
+        # Attach the cells at flat indices idx and bump their neighbours'
+        # attached counts, so the step never has to recount them
+        self.attached.ravel()[idx] = True
+        nidx = self.neighbors_idx[idx].ravel()
+        np.add.at(self.n_attached.ravel(), nidx[nidx >= 0], 1)
+
     def step(self):
-        for cell in self.cells:
-            if cell is None or cell.attached:
-                continue
-            cell.step_one()
-        for cell in self.cells:
-            if cell is None or cell.attached:
-                continue
-            cell.step_two()
-        for cell in self.cells:
-            if cell is None or cell.attached:
-                continue
-            cell.step_three()
+        # One uniform draw per cell for the noise rule
+        self._rng.random(dtype=np.float32, out=self._noise)
+        if NUMBA_ENABLED:
+            self._step_numba()
+        else:
+            self._step_numpy()
         self.iteration += 1
         self.environment.step(self.iteration)
 
+    def _step_numba(self):
+        env = self.environment
+        if self.threads:
+            set_num_threads(min(self.threads, numba_config.NUMBA_NUM_THREADS))
+        _step_kernel(self.dm, self._next_dm, self.bm, self.cm, self.age,
+                     self.attached, self.boundary, self.n_attached, self._noise,
+                     env["beta"], env["theta"], env["alpha"], env["kappa"],
+                     env["mu"], env["upsilon"], env["sigma"])
+
+    def _step_numpy(self):
+        env = self.environment
+        free = ~self.attached
+        n_attached = self.n_attached
+        boundary = self.boundary = free & (n_attached > 0)
+
+        # diffusion: attached neighbours contribute the cell's own mass
+        neighbor_dm = self._neighbor_sum(np.where(free, self.dm, 0))
+        next_dm = (self.dm * (n_attached + 1) + neighbor_dm) / (self.n_neighbors + 1)
+        dm = np.where(free, next_dm, self.dm)
+        self.age += free
+
+        # The remaining rules only touch boundary cells, so they run on the
+        # flat indices of those cells instead of masking the whole lattice
+        bidx = np.flatnonzero(boundary)
+        dm_flat = dm.ravel()
+        bm_flat = self.bm.ravel()
+        cm_flat = self.cm.ravel()
+
+        # freezing
+        mass = dm_flat[bidx]
+        bm = bm_flat[bidx] + (1 - env["kappa"]) * mass
+        cm = cm_flat[bidx] + env["kappa"] * mass
+        dm_flat[bidx] = 0
+
+        # attachment
+        nidx = self.neighbors_idx[bidx]
+        summed_dm = np.where(nidx >= 0, dm_flat[nidx], 0).sum(axis=1)
+        count = n_attached.ravel()[bidx]
+        attach = (
+            ((count <= 2) & (bm > env["beta"]))
+            | ((count == 3) & ((bm >= 1) | ((summed_dm < env["theta"]) & (bm >= env["alpha"]))))
+            | (count >= 4))
+
+        # melting
+        dm_flat[bidx] = env["mu"] * bm + env["upsilon"] * cm
+        bm *= 1 - env["mu"]
+        cm *= 1 - env["upsilon"]
+
+        cm[attach] += bm[attach]
+        bm[attach] = 0
+        bm_flat[bidx] = bm
+        cm_flat[bidx] = cm
+        self._mark_attached(bidx[attach])
+
+        # noise
+        factor = np.where(self._noise >= 0.5, np.float32(1 - env["sigma"]), np.float32(1 + env["sigma"]))
+        self.dm = np.where(free & ~boundary, dm * factor, dm)
+
     def headroom(self):
         if self.max_steps and self.iteration >= self.max_steps:
             return False
@@ -131,32 +256,37 @@ class CrystalLattice:
         return True
 
     def snowflake_radius(self, angle=135):
-        radius = 0
-        half = self.size / 2.0
-        while radius < half:
-            radius += 1
-            xy = self.polar_to_xy((angle, radius))
-            cell = self.cells[self._cell_index(xy)]
-            if cell.attached or cell.boundary:
-                continue
-            return radius
-        return int(round(half))
+        # Distance along the ray to the first cell that is neither attached
+        # nor on the boundary
+        (xs, ys) = self._ray(angle)
+        gaps = ~(self.attached[ys, xs] | self.boundary[ys, xs])
+        if not gaps.any():
+            return int(round(self.size / 2.0))
+        return int(np.argmax(gaps)) + 1
+
+    def _ray(self, angle):
+        # Cell coordinates at radius 1, 2, ... out to the lattice edge
+        rays = self._rays
+        if angle not in rays:
+            half = self.size / 2.0
+            (cos_a, sin_a) = _unit_vector(angle)
+            radius = np.arange(1, math.ceil(half) + 1)
+            xs = np.rint(half + (cos_a * radius)).astype(np.intp)
+            ys = np.rint(half - (sin_a * radius)).astype(np.intp)
+            inside = np.cumprod((xs >= 0) & (xs < self.size) & (ys >= 0) & (ys < self.size)).astype(bool)
+            rays[angle] = (xs[inside], ys[inside])
+        return rays[angle]
 
     def polar_to_xy(self, args):
         (angle, distance) = args
         half = self.size / 2.0
-        angle = math.radians(angle)
-        y = int(round(half - (math.sin(angle) * distance)))
-        x = int(round(half + (math.cos(angle) * distance)))
+        (cos_a, sin_a) = _unit_vector(angle)
+        y = int(round(half - (sin_a * distance)))
+        x = int(round(half + (cos_a * distance)))
         return x, y
 
     def plot_snowflake(self):
-        grid = np.zeros((self.size, self.size))
-        for x in range(self.size):
-            for y in range(self.size):
-                cell = self.cells[self._cell_index((x, y))]
-                if cell and cell.attached:
-                    grid[y, x] = 1
+        grid = self.attached.astype(float)
         
         plt.imshow(grid, cmap='cool', interpolation='nearest')
         plt.title("Generated Snowflake")
@@ -168,105 +298,115 @@ class CrystalLattice:
         r = RenderSnowflake(self)
         r.save_image(fn, **kw)
 
+if NUMBA_ENABLED:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _step_kernel(dm, next_dm, bm, cm, age, attached, boundary, n_attached, noise,
+                     beta, theta, alpha, kappa, mu, upsilon, sigma):
+        # Same rules as CrystalLattice._step_numpy. The first pass diffuses
+        # and freezes into next_dm, the second reads the frozen neighbourhood
+        # from next_dm and writes the finished step back into dm, so no cell
+        # reads a value another thread is writing. Each pass is one parallel
+        # region over rows; attached is only read in the first pass and only
+        # written for a thread's own cells in the second. n_attached is
+        # recounted in the first pass, since threads cannot safely bump each
+        # other's counts.
+        (size_y, size_x) = dm.shape
+        for y in prange(size_y):
+            for x in range(size_x):
+                if attached[y, x]:
+                    next_dm[y, x] = dm[y, x]
+                    continue
+                total = dm[y, x]
+                count = 0
+                n_att = 0
+                for (dx, dy) in HEX_OFFSETS:
+                    nx = x + dx
+                    ny = y + dy
+                    if nx < 0 or nx >= size_x or ny < 0 or ny >= size_y:
+                        continue
+                    count += 1
+                    if attached[ny, nx]:
+                        n_att += 1
+                        total += dm[y, x]
+                    else:
+                        total += dm[ny, nx]
+                mass = total / (count + 1)
+                age[y, x] += 1
+                n_attached[y, x] = n_att
+                boundary[y, x] = n_att > 0
+                if n_att > 0:
+                    bm[y, x] += (1 - kappa) * mass
+                    cm[y, x] += kappa * mass
+                    mass = 0.0
+                next_dm[y, x] = mass
+
+        for y in prange(size_y):
+            for x in range(size_x):
+                mass = next_dm[y, x]
+                if attached[y, x]:
+                    dm[y, x] = mass
+                    continue
+                if not boundary[y, x]:
+                    if noise[y, x] < 0.5:
+                        mass *= 1 + sigma
+                    else:
+                        mass *= 1 - sigma
+                    dm[y, x] = mass
+                    continue
+                n_att = n_attached[y, x]
+                attach = False
+                if n_att <= 2:
+                    attach = bm[y, x] > beta
+                elif n_att == 3:
+                    if bm[y, x] >= 1:
+                        attach = True
+                    else:
+                        summed = mass
+                        for (dx, dy) in HEX_OFFSETS:
+                            nx = x + dx
+                            ny = y + dy
+                            if 0 <= nx < size_x and 0 <= ny < size_y:
+                                summed += next_dm[ny, nx]
+                        attach = summed < theta and bm[y, x] >= alpha
+                else:
+                    attach = True
+                mass += mu * bm[y, x] + upsilon * cm[y, x]
+                bm[y, x] *= 1 - mu
+                cm[y, x] *= 1 - upsilon
+                if attach:
+                    cm[y, x] += bm[y, x]
+                    bm[y, x] = 0
+                    attached[y, x] = True
+                dm[y, x] = mass
+
+def _lattice_field(name):
+    def get(self):
+        (x, y) = self.xy
+        return getattr(self.lattice, name)[y, x]
+    return property(get)
+
 class SnowflakeCell:
+    """A view of one lattice site; the state itself lives in the lattice arrays."""
+    __slots__ = ("xy", "lattice", "env")
+
+    diffusive_mass = _lattice_field("dm")
+    boundary_mass = _lattice_field("bm")
+    crystal_mass = _lattice_field("cm")
+    attached = _lattice_field("attached")
+    boundary = _lattice_field("boundary")
+    age = _lattice_field("age")
+
     def __init__(self, xy, lattice):
         self.xy = xy
         self.lattice = lattice
         self.env = lattice.environment
-        self.diffusive_mass = self.env["gamma"]
-        self.boundary_mass = 0.0
-        self.crystal_mass = 0.0
-        self.attached = False
-        self.boundary = 0
-        self.attached_neighbors = []
-        self.__neighbors = None
-        self.age = 0  # Initialize age attribute
 
     @property
     def neighbors(self):
-        if self.__neighbors is None:
-            self.__neighbors = self.lattice.get_neighbors(self.xy)
-        return self.__neighbors
-
-    def update_boundary(self):
-        self.boundary = not self.attached and any(cell.attached for cell in self.neighbors)
-
-    def step_one(self):
-        self.update_boundary()
-        if self.boundary:
-            self.attached_neighbors = [cell for cell in self.neighbors if cell.attached]
-        self._next_dm = self.diffusion_calc()
-
-    def step_two(self):
-        self.diffusive_mass = self._next_dm
-        self.attachment_flag = self.attached
-        self.freezing_step()
-        self.attachment_flag = self.attachment_step()
-        self.melting_step()
-
-    def step_three(self):
-        if self.boundary and self.attachment_flag:
-            self.attach()
-        self.noise_step()
-
-    def diffusion_calc(self):
-        next_dm = self.diffusive_mass
-        if self.attached:
-            return next_dm
-        self.age += 1
-        for cell in self.neighbors:
-            if cell.attached:
-                next_dm += self.diffusive_mass
-            else:
-                next_dm += cell.diffusive_mass
-        return next_dm / (len(self.neighbors) + 1)
+        return self.lattice.get_neighbors(self.xy)
 
     def attach(self, offset=0.0):
-        self.crystal_mass = self.boundary_mass + self.crystal_mass + offset
-        self.boundary_mass = 0
-        self.attached = True
-
-    def freezing_step(self):
-        if not self.boundary:
-            return
-        self.boundary_mass += (1 - self.env["kappa"]) * self.diffusive_mass
-        self.crystal_mass += (self.env["kappa"] * self.diffusive_mass)
-        self.diffusive_mass = 0
-
-    def attachment_step(self):
-        if not self.boundary:
-            return False
-        attach_count = len(self.attached_neighbors)
-        if attach_count <= 2:
-            if self.boundary_mass > self.env["beta"]:
-                return True
-        elif attach_count == 3:
-            if self.boundary_mass >= 1:
-                return True
-            else:
-                summed_diffusion = self.diffusive_mass
-                for cell in self.neighbors:
-                    summed_diffusion += cell.diffusive_mass
-                if summed_diffusion < self.env["theta"] and self.boundary_mass >= self.env["alpha"]:
-                    return True
-        elif attach_count >= 4:
-            return True
-        return False
-
-    def melting_step(self):
-        if not self.boundary:
-            return
-        self.diffusive_mass += self.env["mu"] * self.boundary_mass + self.env["upsilon"] * self.crystal_mass
-        self.boundary_mass = (1 - self.env["mu"]) * self.boundary_mass
-        self.crystal_mass = (1 - self.env["upsilon"]) * self.crystal_mass
-
-    def noise_step(self):
-        if self.boundary or self.attached:
-            return
-        if random.random() >= 0.5:
-            self.diffusive_mass = (1 - self.env["sigma"]) * self.diffusive_mass
-        else:
-            self.diffusive_mass = (1 + self.env["sigma"]) * self.diffusive_mass
+        self.lattice.attach(self.xy, offset)
 
 def run():
     size = 1000
@@ -11,6 +11,7 @@ import re
 import colorsys
 from xml.dom.minidom import parse
 
+import numpy as np
 from PIL import Image, ImageDraw  # PIL is imported directly in Python 3
 
 #from sfgen import *
@@ -20,45 +21,48 @@ class ColorScheme:
 
     def __init__(self, lattice):
         self.lattice = lattice
-        self.cells = self.lattice.cells
 
-    def __call__(self, cell, **kw):
+    def __call__(self, **kw):
+        "Returns the lattice as an RGB array of shape (size, size, 3)."
         pass
 
 class Grayscale(ColorScheme):
     Name = "grayscale"
+    # RGB triple for each quantized gray level
+    LUT = np.repeat(np.arange(256, dtype=np.uint8)[:, np.newaxis], 3, axis=1)
 
     def __init__(self, lattice, boundary=False):
         self.boundary = boundary
         super().__init__(lattice)
 
-    def __call__(self, cell, **kw):
-        mass = cell.diffusive_mass
-        if cell.attached:
-            mass = cell.crystal_mass
-        color = 200 * mass
-        color = min(255, int(color))
-        color = (color, color, color)
-        return color
+    def __call__(self, **kw):
+        mass = np.where(self.lattice.attached, self.lattice.cm, self.lattice.dm)
+        return self.LUT[np.clip((200 * mass).astype(np.int32), 0, 255)]
 
 class BlackWhite(ColorScheme):
     Name = "blackwhite"
+    LUT = np.array([(0, 0, 0), (0xFF, 0xFF, 0xFF)], dtype=np.uint8)
 
     def __init__(self, lattice, boundary=False):
         self.boundary = boundary
         super().__init__(lattice)
 
-    def __call__(self, cell):
-        color = (0, 0, 0)
-        if self.boundary and cell.boundary or cell.attached:
-            color = (0xFF, 0xFF, 0xFF)
-        return color
+    def __call__(self, **kw):
+        white = self.lattice.attached
+        if self.boundary:
+            white = white | self.lattice.boundary
+        return self.LUT[white.view(np.uint8)]
 
 class Colorful(ColorScheme):
     Name = "colorful"
 
-    def __call__(self, cell, **kw):
-        return tuple([int(round(x * 0xff)) for x in colorsys.hsv_to_rgb(cell.age / float(self.lattice.iteration), 1, 1)])
+    def __call__(self, **kw):
+        # Ages are whole steps, so one colour per possible age covers the frame
+        age = self.lattice.age
+        iteration = float(self.lattice.iteration)
+        hues = [colorsys.hsv_to_rgb(a / iteration, 1, 1) for a in range(int(age.max()) + 1)]
+        lut = np.array([[int(round(x * 0xff)) for x in rgb] for rgb in hues], dtype=np.uint8)
+        return lut[age]
 
 class LaserScheme(ColorScheme):
     Name = "laser"
@@ -77,26 +81,24 @@ class LaserScheme(ColorScheme):
 
     def _init_clusters(self):
         import scipy.cluster.vq
-        import numpy as np
-        acells = [cell for cell in self.cells if cell and cell.attached]
-        fm = [cell.crystal_mass for cell in acells]
-        clusters = scipy.cluster.vq.kmeans2(np.array(fm), self.layers)
-        cluster_map = clusters[1]
-        self._layer_cache = {cell.xy: cluster for (cell, cluster) in zip(acells, cluster_map)}
-
-    def __call__(self, cell, layer=None, **kw):
+        attached = self.lattice.attached
+        fm = self.lattice.cm[attached].reshape(-1, 1).astype(np.float32)
+        (centroids, labels) = scipy.cluster.vq.kmeans2(fm, self.layers, minit='++')
+        # Layer of each attached cell, -1 everywhere else
+        self._layer_grid = np.full(attached.shape, -1, dtype=np.int8)
+        self._layer_grid[attached] = labels
+
+    def __call__(self, layer=None, **kw):
         if layer is None:
             layer = self.layer
-        if cell.xy in self._layer_cache and self._layer_cache[cell.xy] == layer:
-            return self.scheme(cell, **kw)
-        return (0, 0, 0)
+        mask = self._layer_grid == layer
+        return np.where(mask[..., np.newaxis], self.scheme(**kw), 0).astype(np.uint8)
 
 class RenderSnowflake:
     ColorSchemes = {cls.Name: cls for cls in globals().values() if isinstance(cls, type) and issubclass(cls, ColorScheme) and cls != ColorScheme}
 
     def __init__(self, lattice):
         self.lattice = lattice
-        self.cells = self.lattice.cells
 
     def save_layer(self, fn, scheme, layer, **kw):
         scheme.select_layer(layer)
@@ -119,21 +121,36 @@ class RenderSnowflake:
             scheme = Grayscale(self.lattice)
             #scheme = Colorful(self.lattice)
         msg = f"Saving {fn}..."
-        content = ''.join([''.join(map(chr, scheme(cell))) for cell in self.cells])
-        img = Image.new("RGB", (self.lattice.size, self.lattice.size))
-        img.frombytes(content.encode('latin1'))
-        del content
+        img = Image.fromarray(scheme())
         X_SCALE_FACTOR = (1.0 / math.sqrt(3))
-        # post-process
+        # post-process: each step contributes the inverse of its affine map
+        # (output pixel -> input pixel), so the image is resampled only once
+        size = img.size
+        matrix = np.identity(3)
         if rotate:
-            img = img.rotate(45)
+            # same map as img.rotate(45) about the image centre
+            (cx, cy) = (size[0] / 2.0, size[1] / 2.0)
+            c = math.cos(math.radians(45))
+            s = math.sin(math.radians(45))
+            matrix = matrix @ [[c, -s, cx - c * cx + s * cy], [s, c, cy - s * cx - c * cy], [0, 0, 1]]
         if scale:
-            img = img.resize((int(round(self.lattice.size * X_SCALE_FACTOR)), int(self.lattice.size)))
+            new_size = (int(round(self.lattice.size * X_SCALE_FACTOR)), int(self.lattice.size))
+            matrix = matrix @ _scale_matrix(size, new_size)
+            size = new_size
         if crop:
-            img = img.crop(self.lattice.crop_snowflake(margin=margin))
+            (x0, y0, x1, y1) = [int(round(v)) for v in self.lattice.crop_snowflake(margin=margin)]
+            matrix = matrix @ [[1, 0, x0], [0, 1, y0], [0, 0, 1]]
+            size = (x1 - x0, y1 - y0)
         if resize:
-            y_sz = int(round((resize / float(img.size[0])) * img.size[1]))
+            y_sz = int(round((resize / float(size[0])) * size[1]))
             if y_sz != resize:
                 print("WARNING: image after resize is not square.")
-            img = img.resize((resize, resize))
+            matrix = matrix @ _scale_matrix(size, (resize, resize))
+            size = (resize, resize)
+        if rotate or scale or crop or resize:
+            img = img.transform(size, Image.Transform.AFFINE, tuple(matrix[:2].ravel()), resample=Image.Resampling.BILINEAR)
         img.save(fn)
+
+def _scale_matrix(old_size, new_size):
+    "Maps pixel coordinates in an image resized to new_size back to the original."
+    return [[old_size[0] / new_size[0], 0, 0], [0, old_size[1] / new_size[1], 0], [0, 0, 1]]
@@ -13,22 +13,28 @@ edges = cv2.Canny(image, 100, 250)
 
 # Apply Morphological thinning
 def thinning(img):
-    # Create a skeletonized version of the image
-    size = np.size(img)
+    # Zhang-Suen thinning is a single native call when opencv-contrib is installed
+    if hasattr(cv2, 'ximgproc'):
+        return cv2.ximgproc.thinning(img, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+
+    # Otherwise create a skeletonized version of the image, reusing the same
+    # buffers on every iteration
     skel = np.zeros(img.shape, np.uint8)
+    img = img.copy()
+    eroded = np.empty_like(img)
+    temp = np.empty_like(img)
     
     element = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
     done = False
     
     while not done:
-        eroded = cv2.erode(img, element)
-        temp = cv2.dilate(eroded, element)
-        temp = cv2.subtract(img, temp)
-        skel = cv2.bitwise_or(skel, temp)
-        img = eroded.copy()
-
-        zeros = size - cv2.countNonZero(img)
-        if zeros == size:
+        cv2.erode(img, element, dst=eroded)
+        cv2.dilate(eroded, element, dst=temp)
+        cv2.subtract(img, temp, dst=temp)
+        cv2.bitwise_or(skel, temp, dst=skel)
+        img, eroded = eroded, img
+
+        if cv2.countNonZero(img) == 0:
             done = True
 
     return skel
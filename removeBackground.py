@@ -1,18 +1,25 @@
-# Importing Required Modules 
-from rembg import remove 
-from PIL import Image 
-  
-# Store path of the image in the variable input_path 
-input_path =  "Eiffel.jpg"
-  
-# Store path of the output image in the variable output_path 
-output_path = "removed_Background.png"
-  
-# Processing the image 
-input = Image.open(input_path) 
-  
-# Removing the background from the given Image 
-output = remove(input) 
-  
-#Saving the image in the given path 
-output.save(output_path) 
\ No newline at end of file
+# Importing Required Modules
+from rembg import new_session, remove
+from PIL import Image
+import onnxruntime
+
+# Pairs of (input image, output image) to process
+images = [
+    ("Eiffel.jpg", "removed_Background.png"),
+]
+
+# Load the model once and reuse it for every image, on the GPU if one is available
+providers = ["CPUExecutionProvider"]
+if "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+    providers.insert(0, "CUDAExecutionProvider")
+session = new_session("u2net", providers=providers)
+
+for input_path, output_path in images:
+    # Processing the image
+    input = Image.open(input_path)
+
+    # Removing the background from the given Image
+    output = remove(input, session=session, post_process_mask=True)
+
+    #Saving the image in the given path
+    output.save(output_path)
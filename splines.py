@@ -16,6 +16,8 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 
 """
 
+import numpy as np
+
 def tuples2points(ts):
     return list(map(lambda t: Point(*t), ts))
 
@@ -167,6 +169,11 @@ class Spline(Curve):
     def __init__(self, knots=None):
         self.knots = list(knots) if knots else []
     
+    @classmethod
+    def from_points(cls, xs):
+        "Makes a spline whose knots are the rows of an (N, D) array, D being the dimensionality of Point."
+        return cls([Point(*row) for row in np.asarray(xs, dtype=float)])
+    
     def __repr__(self):
         return f"{type(self).__name__}([{', '.join(map(str, self.knots))}])"
 
@@ -198,30 +205,43 @@ class Polyline(PiecewiseSpline):
         return Line.fit(self.knots[i], self.knots[i + 1])
 
 class NaturalCubicSpline(PiecewiseSpline):
-    "The daddy! Caches results for efficiency."
+    "The daddy! Caches results for efficiency. The coefficients are held as arrays with one row per piece, so a whole batch of u can be evaluated at once."
     
     def __init__(self, knots=None):
         super().__init__(knots)
         self.cachedknots = None
     
     def __getitem__(self, i):
+        self._update()
+        return Cubic(*[Point(*coef[i]) for coef in self.coefs])
+    
+    def __call__(self, u):
+        "u may be a number, giving a Point, or an array of N values, giving an (N, D) array with one row per Point."
+        self._update()
+        (a, b, c, d) = self.coefs
+        u = np.asarray(u, dtype=float)
+        i = np.clip(np.floor(u).astype(int), 0, len(self) - 1)
+        v = (u - i)[..., np.newaxis]
+        p = a[i] + (b[i] * v) + (c[i] * (v ** 2)) + (d[i] * (v ** 3))
+        if p.ndim == 1:
+            return Point(*p)
+        return p
+    
+    def _update(self):
         if self.knots != self.cachedknots:
             self.calculate()
-        return self.pieces[i]
     
     def calculate(self):
         "This code is ultimately derived from some written by Tim Lambert."
-        p = self.knots
-        self.cachedknots = list(p)
+        self.cachedknots = list(self.knots)
+        p = np.array([tuple(k) for k in self.knots], dtype=float)
         g = _gamma(len(p))
         e = _epsilon(g, _delta(p, g))
-        self.pieces = []
-        for i in range(len(p) - 1):
-            a = p[i]
-            b = e[i]
-            c = ((p[i + 1] - p[i]) * 3.0) - ((e[i] * 2.0) + e[i + 1])
-            d = ((p[i] - p[i + 1]) * 2.0) + e[i] + e[i + 1]
-            self.pieces.append(Cubic(a, b, c, d))
+        a = p[:-1]
+        b = e[:-1]
+        c = ((p[1:] - p[:-1]) * 3.0) - ((e[:-1] * 2.0) + e[1:])
+        d = ((p[:-1] - p[1:]) * 2.0) + e[:-1] + e[1:]
+        self.coefs = (a, b, c, d)
 
 def _gamma(n):
     g = [0.5]
@@ -231,18 +251,23 @@ def _gamma(n):
     return g
 
 def _delta(p, g):
-    d = [(p[1] - p[0]) * (g[0] * 3.0)]
-    for i in range(1, len(p) - 1):
-        d.append(((p[i + 1] - p[i - 1]) * 3.0 - d[i - 1]) * g[i])
-    d.append(((p[-1] - p[-2]) * 3.0 - d[-1]) * g[-1])
+    s = np.empty_like(p)
+    s[0] = p[1] - p[0]
+    s[1:-1] = p[2:] - p[:-2]
+    s[-1] = p[-1] - p[-2]
+    s *= 3.0
+    d = np.empty_like(p)
+    d[0] = s[0] * g[0]
+    for i in range(1, len(p)):
+        d[i] = (s[i] - d[i - 1]) * g[i]
     return d
 
 def _epsilon(g, d):
     "Performs backward substitution to solve for epsilon."
-    e = [d[-1]]
+    e = np.empty_like(d)
+    e[-1] = d[-1]
     for i in range(len(d) - 2, -1, -1):
-        e.append(d[i] - (e[-1] * g[i]))
-    e.reverse()
+        e[i] = d[i] - (e[i + 1] * g[i])
     return e
 
 def test_spline(splinetype=NaturalCubicSpline, trim=False):